@@ -3,6 +3,7 @@ import os
 import sys
 import traceback 
 import logging
+import math
 from datetime import datetime
 from werkzeug.middleware.proxy_fix import ProxyFix
 import random
@@ -26,7 +27,9 @@ logger = logging.getLogger('tweet_screenshotter')
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(PROJECT_ROOT)
 
-from main import run_screenshot_capture # Import the function from main.py
+from main import (run_screenshot_capture, is_valid_tweet_url, CaptureError, CircuitOpenError, # Import the capture engine from main.py
+                  FAILURE_TIMEOUT, FAILURE_NOT_FOUND, FAILURE_NO_CONTENT, FAILURE_RATE_LIMITED, FAILURE_BROWSER_CRASH,
+                  FAILURE_INVALID_URL, FAILURE_CIRCUIT_OPEN)
 
 app = Flask(__name__)
 # Support for reverse proxies (helpful when deploying behind Nginx/Apache)
@@ -68,6 +71,38 @@ def image_to_base64_data_url(image_bytes):
     base64_data = base64.b64encode(image_data).decode('utf-8')
     return f"data:image/png;base64,{base64_data}"
 
+# User-facing messages and HTTP status codes (API and single-capture form) for each classified capture failure
+CAPTURE_ERROR_MESSAGES = {
+    FAILURE_TIMEOUT: "Timed out loading the tweet. x.com may be slow right now, please try again shortly.",
+    FAILURE_NOT_FOUND: "Tweet not found. It might be deleted, protected, or from a suspended account.",
+    FAILURE_NO_CONTENT: "The tweet didn't load. x.com may be slow or rate limiting us, or the tweet may be deleted or protected.",
+    FAILURE_RATE_LIMITED: "x.com is rate limiting us. Please try again in a few minutes.",
+    FAILURE_BROWSER_CRASH: "The capture browser crashed. Please try again.",
+    FAILURE_INVALID_URL: "Please enter a valid Tweet URL.",
+}
+CAPTURE_ERROR_STATUS = {
+    FAILURE_TIMEOUT: 504,
+    FAILURE_NOT_FOUND: 404,
+    FAILURE_NO_CONTENT: 502,
+    FAILURE_RATE_LIMITED: 429,
+    FAILURE_BROWSER_CRASH: 502,
+    FAILURE_INVALID_URL: 400,
+    FAILURE_CIRCUIT_OPEN: 503,
+}
+CIRCUIT_OPEN_MESSAGE = "Screenshot service is temporarily unavailable because x.com is failing. Please try again shortly."
+
+def capture_error_message(error):
+    """User-facing message for a CaptureError"""
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN_MESSAGE
+    return CAPTURE_ERROR_MESSAGES.get(error.kind, "Failed to capture screenshot. Tweet might be protected, deleted, or an error occurred.")
+
+def capture_error_headers(error):
+    """Retry-After header for failures that tell the client when to come back"""
+    if error.retry_after is None:
+        return {}
+    return {'Retry-After': str(math.ceil(error.retry_after))}
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -96,12 +131,16 @@ def index():
         if input_mode == 'single':
             tweet_url = request.form.get('tweet_url', '').strip()
             submitted_tweet_url = tweet_url
+            status_code = 200
+            response_headers = {}
             logger.info(f"Single screenshot request for URL: {tweet_url}")
 
             if not tweet_url:
                 error_message = "Please enter a Tweet URL."
-            elif not (tweet_url.startswith('https://x.com/') or tweet_url.startswith('https://twitter.com/')):
+                status_code = 400
+            elif not is_valid_tweet_url(tweet_url):
                 error_message = "Please enter a valid Tweet URL."
+                status_code = 400
             else:
                 try:
                     current_theme_for_capture = night_mode
@@ -113,23 +152,26 @@ def index():
                                                              lang=lang,
                                                              show_engagement=show_engagement)
                     
-                    if screenshot_data and screenshot_data.get('image_bytes'):
-                        # Convert to base64 data URL instead of storing in cache
-                        data_url = image_to_base64_data_url(screenshot_data['image_bytes'])
-                        logger.info(f"Screenshot converted to data URL for {tweet_url}, filename: {screenshot_data['filename']}")
-                        
-                        screenshots_results.append({
-                            'url': tweet_url,
-                            'screenshot_url': data_url,
-                            'filename': screenshot_data['filename']
-                        })
-                        logger.info(f"Screenshot captured for {tweet_url}")
-                    else:
-                        error_message = "Failed to capture screenshot. Tweet might be protected, deleted, or an error occurred."
-                        logger.error(f"Screenshot capture failed for URL: {tweet_url}")
+                    # Convert to base64 data URL instead of storing in cache
+                    data_url = image_to_base64_data_url(screenshot_data['image_bytes'])
+                    logger.info(f"Screenshot converted to data URL for {tweet_url}, filename: {screenshot_data['filename']}")
+                    
+                    screenshots_results.append({
+                        'url': tweet_url,
+                        'screenshot_url': data_url,
+                        'filename': screenshot_data['filename']
+                    })
+                    logger.info(f"Screenshot captured for {tweet_url}")
+                except CaptureError as e:
+                    error_message = capture_error_message(e)
+                    # Same status codes as /api/screenshot
+                    status_code = CAPTURE_ERROR_STATUS.get(e.kind, 500)
+                    response_headers = capture_error_headers(e)
+                    logger.error(f"Screenshot capture failed for URL: {tweet_url} ({e.kind}): {e}")
                 except Exception as e:
                     logger.error(f"Error during single screenshot capture for {tweet_url}: {e}", exc_info=True)
                     error_message = "An unexpected error occurred while generating the screenshot."
+                    status_code = 500
             
             # For single mode, pass the first result directly for template convenience
             single_screenshot_url = screenshots_results[0]['screenshot_url'] if screenshots_results else None
@@ -143,7 +185,7 @@ def index():
                                   submitted_tweet_url=submitted_tweet_url,
                                   selected_night_mode=night_mode_str, # Pass the original string for selection
                                   show_engagement=show_engagement, # Pass the engagement setting
-                                  input_mode=input_mode)
+                                  input_mode=input_mode), status_code, response_headers
         
         elif input_mode == 'bulk':
             bulk_text = request.form.get('bulk_tweet_urls', '').strip()
@@ -157,7 +199,7 @@ def index():
                 valid_urls = []
                 invalid_url_messages = []
                 for u in urls_to_process:
-                    if not (u.startswith('https://x.com/') or u.startswith('https://twitter.com/')):
+                    if not is_valid_tweet_url(u):
                         invalid_url_messages.append(f"Invalid URL: {u}")
                     else:
                         valid_urls.append(u)
@@ -180,24 +222,26 @@ def index():
                         if night_mode == 'random':
                             current_theme_for_capture = i % 3 # Cycle 0, 1, 2
                         
+                        # No retries here: URLs are captured one after another within a single
+                        # request, so retrying each one would run past the Gunicorn worker timeout
                         screenshot_data = run_screenshot_capture(url,
                                                                  night_mode=current_theme_for_capture,
                                                                  lang=lang,
-                                                                 show_engagement=show_engagement)
-                        if screenshot_data and screenshot_data.get('image_bytes'):
-                            # Convert to base64 data URL instead of storing in cache
-                            data_url = image_to_base64_data_url(screenshot_data['image_bytes'])
-                            logger.info(f"Bulk: Screenshot converted to data URL for {url}, filename: {screenshot_data['filename']}")
-                            
-                            screenshots_results.append({
-                                'url': url,
-                                'screenshot_url': data_url,
-                                'filename': screenshot_data['filename']
-                            })
-                            logger.info(f"Bulk: Screenshot captured for {url}")
-                        else:
-                            screenshots_results.append({'url': url, 'error': "Failed to capture screenshot"})
-                            logger.error(f"Bulk: Screenshot capture failed for URL: {url}")
+                                                                 show_engagement=show_engagement,
+                                                                 max_attempts=1)
+                        # Convert to base64 data URL instead of storing in cache
+                        data_url = image_to_base64_data_url(screenshot_data['image_bytes'])
+                        logger.info(f"Bulk: Screenshot converted to data URL for {url}, filename: {screenshot_data['filename']}")
+                        
+                        screenshots_results.append({
+                            'url': url,
+                            'screenshot_url': data_url,
+                            'filename': screenshot_data['filename']
+                        })
+                        logger.info(f"Bulk: Screenshot captured for {url}")
+                    except CaptureError as e:
+                        screenshots_results.append({'url': url, 'error': capture_error_message(e)})
+                        logger.error(f"Bulk: Screenshot capture failed for URL: {url} ({e.kind}): {e}")
                     except Exception as e:
                         logger.error(f"Error during bulk screenshot capture for {url}: {e}", exc_info=True)
                         screenshots_results.append({'url': url, 'error': "An unexpected error occurred"})
@@ -223,6 +267,8 @@ def api_screenshot():
         return jsonify({"error": "Missing tweet_url in JSON payload"}), 400
 
     tweet_url = request.json['tweet_url']
+    if not isinstance(tweet_url, str) or not is_valid_tweet_url(tweet_url):
+        return jsonify({"error": "Invalid tweet_url, expected https://x.com/<user>/status/<id>", "reason": FAILURE_INVALID_URL}), 400
     night_mode = request.json.get('night_mode', 0) # Default to 0 (Light)
     lang = request.json.get('lang', 'en') # Default to 'en'
     show_engagement = request.json.get('show_engagement', False) # Default to not showing engagement metrics
@@ -234,20 +280,23 @@ def api_screenshot():
 
     try:
         screenshot_data = run_screenshot_capture(tweet_url, night_mode=night_mode, lang=lang, show_engagement=show_engagement)
-        if screenshot_data and screenshot_data.get('image_bytes'):
-            # Convert to base64 data URL for API response
-            data_url = image_to_base64_data_url(screenshot_data['image_bytes'])
-            logger.info(f"API: Screenshot converted to data URL for {tweet_url}, filename: {screenshot_data['filename']}")
-            
-            return jsonify({
-                "message": "Screenshot captured successfully",
-                "tweet_url": tweet_url,
-                "screenshot_url": data_url,  # Now returns base64 data URL
-                "filename": screenshot_data['filename']
-            }), 200
+        # Convert to base64 data URL for API response
+        data_url = image_to_base64_data_url(screenshot_data['image_bytes'])
+        logger.info(f"API: Screenshot converted to data URL for {tweet_url}, filename: {screenshot_data['filename']}")
+        
+        return jsonify({
+            "message": "Screenshot captured successfully",
+            "tweet_url": tweet_url,
+            "screenshot_url": data_url,  # Now returns base64 data URL
+            "filename": screenshot_data['filename']
+        }), 200
+    except CaptureError as e:
+        if isinstance(e, CircuitOpenError):
+            logger.warning(f"API: Circuit open, rejecting {tweet_url}")
         else:
-            logger.error(f"API: Screenshot capture failed for URL: {tweet_url}")
-            return jsonify({"error": "Failed to capture screenshot"}), 500
+            logger.error(f"API: Screenshot capture failed for URL: {tweet_url} ({e.kind}): {e}")
+        return (jsonify({"error": capture_error_message(e), "reason": e.kind}),
+                CAPTURE_ERROR_STATUS.get(e.kind, 500), capture_error_headers(e))
     except Exception as e:
         logger.error(f"API error for {tweet_url}: {e}", exc_info=True)
         return jsonify({"error": "An internal error occurred"}), 500
@@ -12,14 +12,18 @@ import os
 import sys
 from datetime import datetime
 
-def capture_tweet_screenshot(url, api_endpoint, night_mode=0):
+def capture_tweet_screenshot(url, api_endpoint, night_mode=0, max_backoffs=2):
     """
     Capture a tweet screenshot using the Tweet Screenshot Generator API.
+
+    The server already retries transient failures itself, so we only wait and retry
+    when it tells us to back off (503 circuit open / 429 rate limited).
     
     Args:
         url (str): The tweet URL to capture
         api_endpoint (str): The API endpoint URL
         night_mode (int): Theme mode (0=light, 1=dark, 2=auto)
+        max_backoffs (int): How many times to honour Retry-After before giving up
         
     Returns:
         dict: API response or None if failed
@@ -33,17 +37,28 @@ def capture_tweet_screenshot(url, api_endpoint, night_mode=0):
         'night_mode': night_mode
     }
     
-    try:
-        response = requests.post(api_endpoint, headers=headers, json=data, timeout=60)
+    for backoff in range(max_backoffs + 1):
+        try:
+            response = requests.post(api_endpoint, headers=headers, json=data, timeout=180)
+        except Exception as e:
+            print(f"Exception occurred: {str(e)}")
+            return None
+
         if response.status_code == 200:
             return response.json()
-        else:
-            print(f"Error: API returned status code {response.status_code}")
-            print(f"Response: {response.text}")
+
+        print(f"Error: API returned status code {response.status_code}")
+        print(f"Response: {response.text}")
+        if response.status_code not in (429, 503) or backoff == max_backoffs:
             return None
-    except Exception as e:
-        print(f"Exception occurred: {str(e)}")
-        return None
+
+        try:
+            retry_after = int(response.headers.get('Retry-After', 30))
+        except ValueError:
+            retry_after = 30
+        print(f"Server asked us to back off, waiting {retry_after} seconds...")
+        time.sleep(retry_after)
+    return None
 
 def download_screenshot(screenshot_url, output_dir, filename=None):
     """
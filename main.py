@@ -3,8 +3,16 @@ from tweetcapture import TweetCapture
 from datetime import datetime
 import traceback
 import os
+import re
 import io # Added for in-memory file handling
 import tempfile # Added for temporary file creation
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
 # Define the path to chromedriver.
 # The ChromeDriver should be available at /app/drivers/chromedriver in the Docker container
@@ -18,7 +26,233 @@ os.environ['WDM_SSL_VERIFY'] = '0'  # Disable SSL verification for faster downlo
 # Set the cache directory to our pre-populated location
 os.environ['WDM_CACHE_ROOT'] = '/app/.wdm'
 
-async def capture_tweet_screenshot(tweet_url, debug=False, night_mode=0, lang='en', show_engagement=False): # Removed output_dir
+# Failure handling for the capture engine. All values can be overridden through
+# environment variables so they can be tuned per deployment without a rebuild.
+CAPTURE_MAX_ATTEMPTS = int(os.environ.get('CAPTURE_MAX_ATTEMPTS', 3))  # Total attempts, including the first one
+CAPTURE_RETRY_BASE_DELAY = float(os.environ.get('CAPTURE_RETRY_BASE_DELAY', 1.0))  # Seconds, doubled per retry
+CAPTURE_RATE_LIMIT_DELAY = float(os.environ.get('CAPTURE_RATE_LIMIT_DELAY', 5.0))  # Seconds, x.com needs longer to cool off
+# Total seconds one call may spend on attempts and backoff. Must stay well below Gunicorn's --timeout (120s),
+# otherwise the worker is killed mid-attempt and the breaker never hears about the failure.
+CAPTURE_RETRY_DEADLINE = float(os.environ.get('CAPTURE_RETRY_DEADLINE', 60))
+# tweet-capture sleeps wait_time + 2s before it even looks for the tweet, so don't retry with less time than this left
+CAPTURE_MIN_ATTEMPT_TIME = 5.0
+NEGATIVE_CACHE_TTL = float(os.environ.get('NEGATIVE_CACHE_TTL', 600))  # Seconds to remember tweets that are gone/protected
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.environ.get('NEGATIVE_CACHE_MAX_ENTRIES', 1000))
+BREAKER_WINDOW_SIZE = int(os.environ.get('BREAKER_WINDOW_SIZE', 20))  # Number of recent attempts considered
+BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 5))  # Don't trip on a handful of attempts
+BREAKER_FAILURE_THRESHOLD = float(os.environ.get('BREAKER_FAILURE_THRESHOLD', 0.5))  # Failure ratio that opens the breaker
+BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', 30))  # Seconds to fail fast before trying again
+PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', 5))  # Seconds to wait for the oEmbed endpoint
+
+# tweet-capture can't tell us why a tweet didn't render, but the oEmbed endpoint can without a browser:
+# 404/403 for deleted, protected or suspended tweets, 429 when we're rate limited.
+OEMBED_URL = 'https://publish.twitter.com/oembed?omit_script=true&url=https://twitter.com/i/status/{tweet_id}'
+
+# Failure kinds reported by CaptureError
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_NOT_FOUND = 'not_found'  # Deleted, protected or suspended (from the oEmbed probe) - retrying won't help
+FAILURE_NO_CONTENT = 'no_content'  # Page loaded without a tweet and the probe couldn't say why
+FAILURE_RATE_LIMITED = 'rate_limited'  # From the oEmbed probe
+FAILURE_BROWSER_CRASH = 'browser_crash'
+FAILURE_UNKNOWN = 'unknown'
+FAILURE_INVALID_URL = 'invalid_url'  # Caller error, rejected before Chrome is launched
+FAILURE_CIRCUIT_OPEN = 'circuit_open'
+
+# Only these are worth another Chrome launch
+TRANSIENT_FAILURES = {FAILURE_TIMEOUT, FAILURE_RATE_LIMITED, FAILURE_BROWSER_CRASH, FAILURE_NO_CONTENT}
+# Only these say something about x.com's health, so only these count against the circuit breaker.
+# Caller errors (bad URLs) and unknown errors must not let one client trip the breaker for everyone.
+UPSTREAM_FAILURES = TRANSIENT_FAILURES
+
+# Copied from tweetcapture.utils.is_valid_tweet_url so we reject exactly what tweet-capture would reject.
+# Only the prefix has to match, so share links like .../status/<id>/photo/1 are accepted too.
+TWEET_URL_PATTERN = re.compile(r'^https?://([A-Za-z0-9.]+)?(twitter\.com|x\.com)/(?:#!/)?(\w+)/status(es)?/(\d+)')
+
+# tweet-capture 0.2.5 never reads page text. Besides Selenium's own exceptions it only raises
+# "Invalid tweet url", "File already exists", "webdriver cannot be initialized" and "Tweets not found".
+# The last one means no <article> rendered, whatever the reason - it is NOT proof that the tweet is gone.
+INVALID_URL_MARKERS = ('invalid tweet url',)
+NO_CONTENT_MARKERS = ('tweets not found',)
+BROWSER_CRASH_MARKERS = ('crash', 'chrome not reachable', 'session deleted', 'invalid session id',
+                         'disconnected', 'devtoolsactiveport', 'cannot connect to chrome',
+                         'webdriver cannot be initialized')
+
+
+class CaptureError(Exception):
+    """
+    Raised by run_screenshot_capture when a tweet could not be captured.
+
+    Attributes:
+    kind (str): One of the FAILURE_* constants.
+    retry_after (float): Seconds the caller should wait before trying again, or None.
+    """
+    def __init__(self, kind, message, retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+
+    @property
+    def transient(self):
+        return self.kind in TRANSIENT_FAILURES
+
+
+class CircuitOpenError(CaptureError):
+    """Raised without touching Chrome while the circuit breaker is open."""
+    def __init__(self, retry_after):
+        super().__init__(FAILURE_CIRCUIT_OPEN,
+                         "Capture temporarily disabled: too many upstream failures",
+                         retry_after=retry_after)
+
+
+def is_valid_tweet_url(tweet_url):
+    """Returns True if tweet_url looks like a single tweet (https://x.com/<user>/status/<id>)."""
+    return bool(tweet_url) and TWEET_URL_PATTERN.match(tweet_url.strip()) is not None
+
+
+def get_tweet_id(tweet_url):
+    """Returns the tweet ID from a tweet URL, or None if it isn't one."""
+    result = TWEET_URL_PATTERN.match(tweet_url.strip()) if tweet_url else None
+    return result[5] if result else None
+
+
+def classify_capture_error(error):
+    """
+    Maps an exception raised during capture to one of the FAILURE_* kinds.
+    Selenium rarely gives us typed errors for x.com problems, so we fall back to the message text.
+    """
+    if isinstance(error, CaptureError):
+        return error.kind
+    message = str(error).lower()
+    if any(marker in message for marker in INVALID_URL_MARKERS):
+        return FAILURE_INVALID_URL
+    if isinstance(error, (TimeoutException, asyncio.TimeoutError, TimeoutError)) or 'timed out' in message or 'timeout' in message:
+        return FAILURE_TIMEOUT
+    if any(marker in message for marker in NO_CONTENT_MARKERS):
+        return FAILURE_NO_CONTENT
+    if isinstance(error, WebDriverException) or any(marker in message for marker in BROWSER_CRASH_MARKERS):
+        return FAILURE_BROWSER_CRASH
+    return FAILURE_UNKNOWN
+
+
+def probe_tweet(tweet_url, timeout=PROBE_TIMEOUT):
+    """
+    Asks the oEmbed endpoint whether a tweet exists, without launching Chrome.
+    Returns FAILURE_NOT_FOUND, FAILURE_RATE_LIMITED, or None if the tweet exists or the probe was inconclusive.
+    """
+    tweet_id = get_tweet_id(tweet_url)
+    if tweet_id is None:
+        return None
+    try:
+        with urllib.request.urlopen(OEMBED_URL.format(tweet_id=tweet_id), timeout=timeout):
+            return None
+    except urllib.error.HTTPError as e:
+        if e.code in (403, 404):
+            return FAILURE_NOT_FOUND
+        if e.code == 429:
+            return FAILURE_RATE_LIMITED
+        print(f"Probe for {tweet_url} returned HTTP {e.code}")
+        return None
+    except Exception as e:
+        print(f"Probe for {tweet_url} failed: {e}")
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens when the failure ratio over the last `window_size` upstream attempts reaches `failure_threshold`.
+    While open every call fails fast; after `cooldown` seconds a single trial call is let through
+    (half-open) and its outcome decides whether the breaker closes again.
+    """
+    def __init__(self, window_size, min_calls, failure_threshold, cooldown):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window_size)  # True = failure
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not go upstream."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpenError(retry_after=max(remaining, 1.0))
+            self._trial_in_flight = True  # Half-open: let this one call through
+
+    def open_for(self):
+        """Seconds until the breaker lets a trial call through, or None if it is closed."""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            return max(self.cooldown - (time.monotonic() - self._opened_at), 0.0)
+
+    def release(self):
+        """Records nothing, but lets the next call through if this one was the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, failed):
+        with self._lock:
+            if self._opened_at is not None and self._trial_in_flight:
+                self._trial_in_flight = False
+                if failed:
+                    self._opened_at = time.monotonic()
+                    print("Circuit breaker: trial capture failed, staying open")
+                else:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                    print("Circuit breaker: trial capture succeeded, closing")
+                return
+            self._outcomes.append(failed)
+            if self._opened_at is None and len(self._outcomes) >= self.min_calls:
+                failure_ratio = sum(self._outcomes) / len(self._outcomes)
+                if failure_ratio >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                    print(f"Circuit breaker: opening for {self.cooldown}s, failure ratio {failure_ratio:.0%} over last {len(self._outcomes)} attempts")
+
+
+class NegativeCache:
+    """Remembers tweets that permanently failed (deleted/protected) so we don't launch Chrome for them again."""
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, message)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(tweet_url):
+        # The tweet ID is unique across host/user spellings, and theme/lang don't change whether it exists
+        return get_tweet_id(tweet_url) or tweet_url
+
+    def get(self, tweet_url):
+        key = self._key(tweet_url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def add(self, tweet_url, message):
+        key = self._key(tweet_url)
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                # Evict the entry closest to expiry
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            self._entries[key] = (time.monotonic() + self.ttl, message)
+
+
+# Shared by all requests in this worker process
+circuit_breaker = CircuitBreaker(BREAKER_WINDOW_SIZE, BREAKER_MIN_CALLS, BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN)
+negative_cache = NegativeCache(NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_MAX_ENTRIES)
+
+async def capture_tweet_screenshot(tweet_url, debug=False, night_mode=0, lang='en', show_engagement=False, raise_errors=False): # Removed output_dir
     """
     Captures a screenshot of a tweet using TweetCapture.
 
@@ -28,10 +262,12 @@ async def capture_tweet_screenshot(tweet_url, debug=False, night_mode=0, lang='e
     night_mode (int): Sets the theme (0 = Light, 1 = Dark, 2 = Black).
     lang (str): Language code for the tweet display (e.g., 'en' for English, 'es' for Spanish).
     show_engagement (bool): If True, shows engagement metrics (retweets/likes/views).
+    raise_errors (bool): If True, raises a classified CaptureError instead of returning None.
 
     Returns:
     dict: A dictionary containing 'image_bytes' (io.BytesIO object) and 
-          'filename' (str, suggested filename for download), or None if there was an error.
+          'filename' (str, suggested filename for download), or None if there was an error
+          and raise_errors is False.
     """
     # Set mode based on show_engagement parameter:
     # Mode 1 or 2 shows engagement metrics, Mode 4 (default) hides them
@@ -146,6 +382,10 @@ async def capture_tweet_screenshot(tweet_url, debug=False, night_mode=0, lang='e
             traceback.print_exc()
         else:
             print(f"Error details: {str(error)}")
+        if raise_errors:
+            kind = classify_capture_error(error)
+            print(f"Capture failure for {tweet_url} classified as: {kind}")
+            raise CaptureError(kind, str(error) or error.__class__.__name__) from error
         return None
     finally:
         if temp_output_filename and os.path.exists(temp_output_filename):
@@ -155,25 +395,114 @@ async def capture_tweet_screenshot(tweet_url, debug=False, night_mode=0, lang='e
             except Exception as e:
                 print(f"Error deleting temporary file {temp_output_filename}: {e}")
 
-def run_screenshot_capture(tweet_url, night_mode=0, lang='en', show_engagement=False): # Removed output_dir
+def _retry_delay(kind, attempt):
+    """Exponential backoff with jitter; rate limiting starts from a longer base delay."""
+    base = CAPTURE_RATE_LIMIT_DELAY if kind == FAILURE_RATE_LIMITED else CAPTURE_RETRY_BASE_DELAY
+    delay = base * (2 ** (attempt - 1))
+    return delay + random.uniform(0, delay / 2)
+
+def _run_capture_attempt(tweet_url, timeout, night_mode, lang, show_engagement):
+    """
+    Runs a single capture in a worker thread and gives up on it after `timeout` seconds.
+    tweet-capture doesn't set a page load timeout, so Selenium's default (300s) would otherwise
+    outlive the Gunicorn worker. The abandoned thread finishes (and quits Chrome) in the background.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = asyncio.run(capture_tweet_screenshot(tweet_url, debug=True, night_mode=night_mode, lang=lang,
+                                                                     show_engagement=show_engagement, raise_errors=True))
+        except Exception as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=target, name=f"capture-{get_tweet_id(tweet_url)}", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise CaptureError(FAILURE_TIMEOUT, f"Capture did not finish within {timeout:.1f}s")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+def run_screenshot_capture(tweet_url, night_mode=0, lang='en', show_engagement=False, max_attempts=None): # Removed output_dir
     """
     Synchronous wrapper to run the async screenshot capture.
-    Returns a dict with image_bytes and filename, or None.
+    Returns a dict with image_bytes and filename. It never returns None: every failure is raised.
+
+    Transient failures (timeout, rate limiting, browser crash, empty page) are retried up to
+    CAPTURE_MAX_ATTEMPTS times. Attempts and backoff together never run past CAPTURE_RETRY_DEADLINE;
+    an attempt still running at the deadline is reported as a timeout.
+    When no tweet renders, the oEmbed endpoint is probed first: tweets it reports as deleted/protected
+    are not retried and are remembered in the negative cache. The circuit breaker fails fast while
+    x.com is struggling.
     
     Parameters:
     tweet_url (str): The URL of the tweet to capture.
     night_mode (int): Sets the theme (0 = Light, 1 = Dark, 2 = Black).
     lang (str): Language code for the tweet display.
     show_engagement (bool): If True, shows engagement metrics (retweets/likes/views).
+    max_attempts (int): Overrides CAPTURE_MAX_ATTEMPTS, e.g. 1 to disable retries.
+
+    Raises:
+    CaptureError: If the capture failed or tweet_url is not a tweet URL;
+                  CircuitOpenError if it was not attempted at all.
     """
+    if not is_valid_tweet_url(tweet_url):
+        raise CaptureError(FAILURE_INVALID_URL, f"Invalid tweet url: {tweet_url}")
+
+    cached_failure = negative_cache.get(tweet_url)
+    if cached_failure is not None:
+        print(f"Skipping {tweet_url}: recently failed permanently ({cached_failure})")
+        raise CaptureError(FAILURE_NOT_FOUND, cached_failure)
+
     print(f"Starting screenshot capture for {tweet_url} with night_mode: {night_mode}, lang: {lang}, show_engagement: {show_engagement}")
-    result = asyncio.run(capture_tweet_screenshot(tweet_url, debug=True, night_mode=night_mode, lang=lang, show_engagement=show_engagement))
-    
-    if result and result['image_bytes']:
+    max_attempts = max_attempts or CAPTURE_MAX_ATTEMPTS
+    deadline = time.monotonic() + CAPTURE_RETRY_DEADLINE
+    attempt = 0
+    while True:
+        attempt += 1
+        circuit_breaker.before_call()
+        try:
+            result = _run_capture_attempt(tweet_url, deadline - time.monotonic(),
+                                          night_mode=night_mode, lang=lang, show_engagement=show_engagement)
+        except CaptureError as error:
+            if error.kind == FAILURE_NO_CONTENT:
+                # Find out why nothing rendered before spending another Chrome launch on it
+                probed_kind = probe_tweet(tweet_url)
+                if probed_kind is not None:
+                    print(f"Probe for {tweet_url}: {probed_kind}")
+                    error = CaptureError(probed_kind, str(error))
+            if error.kind in UPSTREAM_FAILURES:
+                circuit_breaker.record(failed=True)
+            elif error.kind == FAILURE_NOT_FOUND:
+                # x.com answered fine, the tweet is just gone
+                circuit_breaker.record(failed=False)
+            else:
+                circuit_breaker.release()
+            if error.kind == FAILURE_NOT_FOUND:
+                negative_cache.add(tweet_url, str(error))
+            delay = _retry_delay(error.kind, attempt)
+            out_of_time = time.monotonic() + delay + CAPTURE_MIN_ATTEMPT_TIME > deadline
+            if not error.transient or attempt >= max_attempts or out_of_time:
+                print(f"Failed to capture screenshot for {tweet_url} after {attempt} attempt(s): {error.kind}")
+                raise error
+            # This failure may just have opened the breaker - don't sleep through the backoff for nothing
+            open_for = circuit_breaker.open_for()
+            if open_for is not None:
+                print(f"Not retrying {tweet_url}: circuit breaker is open")
+                raise CircuitOpenError(retry_after=max(open_for, 1.0)) from error
+            print(f"Retrying {tweet_url} in {delay:.1f}s (attempt {attempt + 1}/{max_attempts}, reason: {error.kind})")
+            time.sleep(delay)
+            continue
+        except Exception:
+            # Setup errors outside the capture itself say nothing about x.com - just release a half-open trial
+            circuit_breaker.release()
+            raise
+
+        circuit_breaker.record(failed=False)
         print(f"Screenshot successfully captured in memory for {tweet_url}, suggested filename: {result['filename']}")
-    else:
-        print(f"Failed to capture screenshot for {tweet_url}")
-    return result
+        return result
 
 if __name__ == '__main__':
     list_of_tweet_urls = [
@@ -196,9 +525,11 @@ if __name__ == '__main__':
             current_night_mode = night_mode_cycle[current_night_mode_index % len(night_mode_cycle)]
             print(f"Processing URL: {url} with night_mode {current_night_mode}")
             # output_dir is no longer a param for run_screenshot_capture
-            screenshot_data = run_screenshot_capture(url, night_mode=current_night_mode, show_engagement=True) # Test with engagement metrics
-            
-            if screenshot_data and screenshot_data['image_bytes']:
+            try:
+                screenshot_data = run_screenshot_capture(url, night_mode=current_night_mode, show_engagement=True) # Test with engagement metrics
+            except CaptureError as e:
+                print(f"Test: Capture failed for {url} ({e.kind}): {e}")
+            else:
                 # For testing main.py directly, save the file
                 save_path = os.path.join(main_output_dir, screenshot_data['filename'])
                 with open(save_path, 'wb') as f:
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make main.py / app.py importable, the same way app.py finds main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,220 @@
+"""
+Tests for the failure handling around the capture engine in main.py.
+capture_tweet_screenshot and the oEmbed probe are stubbed, so no Chrome or network is needed.
+"""
+import pytest
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import main
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(main.time, 'monotonic', fake_clock)
+    return fake_clock
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Fresh breaker/cache, no backoff sleeps, and a scriptable capture_tweet_screenshot."""
+    monkeypatch.setattr(main, 'circuit_breaker', main.CircuitBreaker(window_size=10, min_calls=3,
+                                                                     failure_threshold=0.5, cooldown=30))
+    monkeypatch.setattr(main, 'negative_cache', main.NegativeCache(ttl=600, max_entries=100))
+    monkeypatch.setattr(main, 'CAPTURE_MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(main, 'probe_tweet', lambda tweet_url: None)
+    sleeps = []
+    monkeypatch.setattr(main.time, 'sleep', sleeps.append)
+
+    class Engine:
+        launches = 0
+        errors = []  # Raised in order, then captures succeed
+        sleeps = None
+
+    Engine.sleeps = sleeps
+
+    async def fake_capture(tweet_url, **kwargs):
+        Engine.launches += 1
+        if Engine.errors:
+            error = Engine.errors.pop(0)
+            raise main.CaptureError(main.classify_capture_error(error), str(error)) from error
+        return {'image_bytes': b'png', 'filename': 'tweet.png'}
+
+    monkeypatch.setattr(main, 'capture_tweet_screenshot', fake_capture)
+    return Engine
+
+
+# Error strings raised by tweet-capture 0.2.5 and Selenium
+@pytest.mark.parametrize('error, kind', [
+    (Exception("Invalid tweet url"), main.FAILURE_INVALID_URL),
+    (Exception("Tweets not found"), main.FAILURE_NO_CONTENT),
+    (Exception("webdriver cannot be initialized"), main.FAILURE_BROWSER_CRASH),
+    (Exception("File already exists"), main.FAILURE_UNKNOWN),
+    (TimeoutException("Timed out receiving message from renderer"), main.FAILURE_TIMEOUT),
+    (WebDriverException("chrome not reachable"), main.FAILURE_BROWSER_CRASH),
+    (Exception("Error at https://x.com/u/status/1429000000000000000"), main.FAILURE_UNKNOWN),
+])
+def test_classify_capture_error(error, kind):
+    assert main.classify_capture_error(error) == kind
+
+
+@pytest.mark.parametrize('url, tweet_id', [
+    ('https://x.com/user/status/123', '123'),
+    ('https://twitter.com/user/status/123?s=20', '123'),
+    ('https://x.com/user/status/123/photo/1', '123'),
+    ('https://mobile.twitter.com/user/status/123', '123'),
+    ('http://www.twitter.com/user/statuses/123', '123'),
+    ('https://x.com/user', None),
+    ('https://example.com/user/status/123', None),
+])
+def test_tweet_url_validation(url, tweet_id):
+    assert main.is_valid_tweet_url(url) == (tweet_id is not None)
+    assert main.get_tweet_id(url) == tweet_id
+
+
+def test_breaker_opens_at_threshold(clock):
+    breaker = main.CircuitBreaker(window_size=4, min_calls=3, failure_threshold=0.5, cooldown=30)
+    breaker.record(failed=True)
+    breaker.record(failed=True)
+    breaker.before_call()  # Below min_calls, still closed
+    breaker.record(failed=False)
+    with pytest.raises(main.CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == 30
+
+
+def test_breaker_lets_one_trial_through_after_cooldown_and_closes(clock):
+    breaker = main.CircuitBreaker(window_size=4, min_calls=2, failure_threshold=0.5, cooldown=30)
+    breaker.record(failed=True)
+    breaker.record(failed=True)
+    clock.advance(31)
+    breaker.before_call()  # The half-open trial
+    with pytest.raises(main.CircuitOpenError):
+        breaker.before_call()  # Only one trial at a time
+    breaker.record(failed=False)
+    assert breaker.open_for() is None
+    breaker.before_call()
+
+
+def test_breaker_reopens_when_trial_fails(clock):
+    breaker = main.CircuitBreaker(window_size=4, min_calls=2, failure_threshold=0.5, cooldown=30)
+    breaker.record(failed=True)
+    breaker.record(failed=True)
+    clock.advance(31)
+    breaker.before_call()
+    breaker.record(failed=True)
+    assert breaker.open_for() == 30
+    with pytest.raises(main.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_release_frees_trial_without_closing(clock):
+    breaker = main.CircuitBreaker(window_size=4, min_calls=2, failure_threshold=0.5, cooldown=30)
+    breaker.record(failed=True)
+    breaker.record(failed=True)
+    clock.advance(31)
+    breaker.before_call()
+    breaker.release()
+    assert breaker.open_for() == 0
+    breaker.before_call()  # Next caller gets the trial
+
+
+def test_negative_cache_shares_entries_across_url_spellings(clock):
+    cache = main.NegativeCache(ttl=60, max_entries=10)
+    cache.add('https://x.com/user/status/123', 'gone')
+    assert cache.get('https://mobile.twitter.com/User/status/123/photo/1') == 'gone'
+    assert cache.get('https://x.com/user/status/456') is None
+
+
+def test_negative_cache_expires(clock):
+    cache = main.NegativeCache(ttl=60, max_entries=10)
+    cache.add('https://x.com/user/status/123', 'gone')
+    clock.advance(61)
+    assert cache.get('https://x.com/user/status/123') is None
+
+
+def test_negative_cache_evicts_entry_closest_to_expiry(clock):
+    cache = main.NegativeCache(ttl=60, max_entries=2)
+    cache.add('https://x.com/user/status/1', 'one')
+    clock.advance(1)
+    cache.add('https://x.com/user/status/2', 'two')
+    cache.add('https://x.com/user/status/2', 'two again')  # Overwrite, no eviction
+    assert cache.get('https://x.com/user/status/1') == 'one'
+    cache.add('https://x.com/user/status/3', 'three')
+    assert cache.get('https://x.com/user/status/1') is None
+    assert cache.get('https://x.com/user/status/2') == 'two again'
+    assert cache.get('https://x.com/user/status/3') == 'three'
+
+
+def test_transient_failure_is_retried(engine):
+    engine.errors = [Exception("webdriver cannot be initialized")]
+    result = main.run_screenshot_capture('https://x.com/user/status/1')
+    assert result['filename'] == 'tweet.png'
+    assert engine.launches == 2
+    assert len(engine.sleeps) == 1
+
+
+def test_invalid_url_never_launches_chrome_or_trips_breaker(engine):
+    for i in range(10):
+        with pytest.raises(main.CaptureError) as excinfo:
+            main.run_screenshot_capture(f'https://x.com/user{i}')
+        assert excinfo.value.kind == main.FAILURE_INVALID_URL
+    assert engine.launches == 0
+    assert main.circuit_breaker.open_for() is None
+
+
+def test_deleted_tweet_is_probed_and_negative_cached(engine, monkeypatch):
+    monkeypatch.setattr(main, 'probe_tweet', lambda tweet_url: main.FAILURE_NOT_FOUND)
+    engine.errors = [Exception("Tweets not found")] * 3
+    for _ in range(2):
+        with pytest.raises(main.CaptureError) as excinfo:
+            main.run_screenshot_capture('https://x.com/user/status/1')
+        assert excinfo.value.kind == main.FAILURE_NOT_FOUND
+    assert engine.launches == 1
+    assert engine.sleeps == []
+    assert main.circuit_breaker.open_for() is None
+
+
+def test_empty_page_probed_as_rate_limited_is_retried(engine, monkeypatch):
+    monkeypatch.setattr(main, 'probe_tweet', lambda tweet_url: main.FAILURE_RATE_LIMITED)
+    engine.errors = [Exception("Tweets not found")]
+    main.run_screenshot_capture('https://x.com/user/status/1')
+    assert engine.launches == 2
+    assert engine.sleeps[0] >= main.CAPTURE_RATE_LIMIT_DELAY
+
+
+def test_breaker_opening_stops_retries_without_sleeping(engine):
+    main.circuit_breaker.record(failed=True)
+    main.circuit_breaker.record(failed=True)
+    engine.errors = [Exception("webdriver cannot be initialized")]
+    with pytest.raises(main.CircuitOpenError):
+        main.run_screenshot_capture('https://x.com/user/status/1')
+    assert engine.launches == 1
+    assert engine.sleeps == []
+    with pytest.raises(main.CircuitOpenError):
+        main.run_screenshot_capture('https://x.com/user/status/2')
+    assert engine.launches == 1
+
+
+def test_hung_attempt_is_cut_off_at_deadline(engine, monkeypatch):
+    monkeypatch.setattr(main, 'CAPTURE_RETRY_DEADLINE', 0.2)
+
+    async def hung_capture(tweet_url, **kwargs):
+        await main.asyncio.sleep(1)
+
+    monkeypatch.setattr(main, 'capture_tweet_screenshot', hung_capture)
+    with pytest.raises(main.CaptureError) as excinfo:
+        main.run_screenshot_capture('https://x.com/user/status/1')
+    assert excinfo.value.kind == main.FAILURE_TIMEOUT
+    assert engine.sleeps == []  # No time left for a retry